@@ -5,25 +5,194 @@ Enhanced Keyword-Based Search with BM25 Algorithm
 Searches patterns and tasks by extracting keywords from user prompts
 """
 
+import bisect
+import heapq
 import json
+import math
 import re
+import sys
+import time
+import zlib
+from array import array
+from operator import mul
 from pathlib import Path
-from math import log
+from math import log, sqrt
 from collections import Counter, defaultdict
+from itertools import islice
 
 DATA_DIR = Path(__file__).parent  # Patterns and tasks are now directly in coding_agent/
 
+# Rerank stage: hashed feature vectors computed locally at index time
+RERANK_DIMENSIONS = 128       # Width of each document vector
+RERANK_DEPTH = 100            # BM25 candidates passed to the rerank stage
+RERANK_WEIGHT = 0.4           # Share of the final score given to cosine similarity
+RERANK_WINDOW = 4             # Co-occurrence window (tokens on each side)
+RERANK_CONTEXT_WEIGHT = 0.5   # Contribution of co-occurrence context vs. the term itself
+
+# BM25 defaults; hot-query results are precomputed with these
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Query log and hot-query cache
+QUERY_LOG_PATH = DATA_DIR / "logs" / "queries.log"
+QUERY_LOG_MAX_BYTES = 1024 * 1024  # Rotate after 1 MB
+QUERY_LOG_BACKUPS = 3
+HOT_QUERY_COUNT = 20              # Queries precomputed at warm-up
+HOT_CACHE_DEPTH = 10              # Results stored per hot query
+HOT_CACHE_FILE = "hot_queries.{index}{mode}.json"  # Stored next to the query log
+HOT_CACHE_MAX_AGE = 3600          # Seconds before hot queries are re-analyzed
+
+# Compressed on-disk index
+INDEX_PATH = DATA_DIR / "index.bin"
+INDEX_MAGIC = b"CAIDX\x01"
+INDEX_VOCAB_BLOCK = 16     # Terms per front-coded vocabulary block
+INDEX_POSTING_BLOCK = 128  # Postings per block between skip entries
+
+# Sharded index
+SHARD_BATCH_SIZE = 1000    # Documents sent to a shard worker per message
+
+
+def _sumprod(a, b):
+    """Portable dot product, used where math.sumprod (3.12+) is missing"""
+    return sum(map(mul, a, b))
+
+
+# math.sumprod runs the dot product in C
+_dot = getattr(math, 'sumprod', _sumprod)
+
+
+class QueryLog:
+    """
+    Append-only log of normalized queries and their latencies
+
+    One JSON object per line, rotated by size like logback's rolling appender
+    (queries.log -> queries.log.1 -> ... -> queries.log.N). Feeds the hot-query
+    analysis used to warm the search cache and reports latency percentiles.
+    """
+
+    def __init__(self, path=QUERY_LOG_PATH, max_bytes=QUERY_LOG_MAX_BYTES, backup_count=QUERY_LOG_BACKUPS):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+    def cache_path(self, index='patterns', rerank=False):
+        """Where precomputed hot-query results for an index (and search mode) are stored"""
+        return self.path.parent / HOT_CACHE_FILE.format(index=index, mode='.rerank' if rerank else '')
+
+    def state(self):
+        """Size and modification time of the current log file (None if missing)"""
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+
+    @staticmethod
+    def normalize(query):
+        """Lowercase and collapse whitespace; punctuation is kept (e.g. /api/products)"""
+        return ' '.join(query.lower().split())
+
+    def record(self, query, latency_ms, result_count, cached=False, index='patterns'):
+        """Append one query to the log. Logging never breaks a search."""
+        entry = {
+            'ts': round(time.time(), 3),
+            'index': index,
+            'query': self.normalize(query),
+            'latency_ms': round(latency_ms, 3),
+            'results': result_count,
+            'cached': cached
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.path.exists() and self.path.stat().st_size >= self.max_bytes:
+                self._rotate()
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+        except OSError:
+            pass
+
+    def _rotate(self):
+        """Shift queries.log.N-1 -> queries.log.N, ..., queries.log -> queries.log.1"""
+        for i in range(self.backup_count - 1, 0, -1):
+            src = self.path.with_name(f"{self.path.name}.{i}")
+            if src.exists():
+                src.replace(self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backup_count > 0:
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+
+    def entries(self, index=None):
+        """Yield logged entries, oldest first, optionally for one index only"""
+        files = [self.path.with_name(f"{self.path.name}.{i}") for i in range(self.backup_count, 0, -1)]
+        files.append(self.path)
+        for log_file in files:
+            if not log_file.exists():
+                continue
+            with open(log_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Partially written line
+                    if index is None or entry.get('index') == index:
+                        yield entry
+
+    def hot_queries(self, limit=HOT_QUERY_COUNT, min_count=2, index=None):
+        """Return the most frequent queries as (query, count) pairs"""
+        counts = Counter(entry['query'] for entry in self.entries(index) if entry.get('query'))
+        return [(query, count) for query, count in counts.most_common(limit) if count >= min_count]
+
+    def latency_percentiles(self, percentiles=(50, 90, 99), index=None):
+        """Return nearest-rank latency percentiles in ms, e.g. {'p50': 0.8, ...}"""
+        latencies = sorted(entry['latency_ms'] for entry in self.entries(index))
+        if not latencies:
+            return {}
+        return {
+            f"p{p}": latencies[max(0, math.ceil(p / 100 * len(latencies)) - 1)]
+            for p in percentiles
+        }
+
 
 class KeywordSearch:
-    def __init__(self):
+    LOG_NAME = 'patterns'  # Tags this index's entries in the query log
+
+    def __init__(self, rerank=False, query_log=None):
         self.index = []
         self.doc_count = 0
         self.avg_doc_length = 0
         self.term_doc_freq = defaultdict(int)  # How many docs contain term
+        self.rerank = rerank
+        self.term_context = {}  # term -> row in self.context_vectors
+        self.context_vectors = array('f')
+        self.doc_vectors = array('f')  # doc_count x RERANK_DIMENSIONS, unit length rows
+        self._feature_cache = {}
+        self.query_log = query_log  # Optional QueryLog
+        self.hot_cache = {}  # normalized query -> precomputed hits
+        self.hot_cache_loaded = False  # True when hits came from a saved cache
         self._build_index()
+        if rerank and not self.doc_vectors:
+            self._build_vectors()
+        if query_log is not None and not self.load_hot_cache():
+            self.warm_up()
     
     def _build_index(self):
-        """Build search index from all patterns and tasks JSON files.
+        """Build search index from all patterns and tasks JSON files"""
+        total_length = 0
+        
+        for doc in self._iter_documents():
+            self.index.append(doc)
+            total_length += doc['doc_length']
+            
+            # Track term document frequency
+            for term in set(doc['tokens']):
+                self.term_doc_freq[term] += 1
+        
+        self.doc_count = len(self.index)
+        self.avg_doc_length = total_length / self.doc_count if self.doc_count > 0 else 0
+    
+    def _iter_documents(self):
+        """Yield one document (metadata, data and tokens) per patterns/tasks JSON file.
         Walk directories using os.walk with followlinks=True so symlinked/junction
         directories are traversed correctly (Windows junctions, Unix symlinks).
         """
@@ -41,49 +210,250 @@ class KeywordSearch:
                     if fname.lower().endswith('.json'):
                         all_files.append(Path(root) / fname)
         
-        total_length = 0
-        
         for json_file in all_files:
             # open files even if they live outside DATA_DIR (symlink targets)
             with open(json_file, 'r', encoding='utf-8') as f:
                 data = json.load(f)
                 
-                # Extract searchable text
-                searchable = self._extract_searchable_text(data)
-                tokens = self._tokenize(searchable)
-
-                # Compute file path relative to DATA_DIR if possible. Handle symlink targets outside DATA_DIR.
-                try:
-                    file_path_rel = str(json_file.relative_to(DATA_DIR))
-                except Exception:
-                    file_path_rel = str(json_file)
-
-                # Determine file type by checking if path contains the tasks directory
-                file_type_var = 'task' if str(DATA_DIR / 'tasks') in str(json_file) else 'pattern'
-
-                doc = {
-                    'id': data.get('id', ''),
-                    'name': data.get('name', ''),
-                    'description': data.get('description', ''),
-                    'keywords': data.get('keywords', []),
-                    'complexity': data.get('complexity', ''),
-                    'file_path': file_path_rel,
-                    'file_type': file_type_var,
-                    'data': data,
-                    'tokens': tokens,
-                    'doc_length': len(tokens)
-                }
-                
-                self.index.append(doc)
-                total_length += len(tokens)
-                
-                # Track term document frequency
-                for term in set(tokens):
-                    self.term_doc_freq[term] += 1
-        
-        self.doc_count = len(self.index)
-        self.avg_doc_length = total_length / self.doc_count if self.doc_count > 0 else 0
+            # Extract searchable text
+            searchable = self._extract_searchable_text(data)
+            tokens = self._tokenize(searchable)
+
+            # Compute file path relative to DATA_DIR if possible. Handle symlink targets outside DATA_DIR.
+            try:
+                file_path_rel = str(json_file.relative_to(DATA_DIR))
+            except Exception:
+                file_path_rel = str(json_file)
+
+            # Determine file type by checking if path contains the tasks directory
+            file_type_var = 'task' if str(DATA_DIR / 'tasks') in str(json_file) else 'pattern'
+
+            yield {
+                'id': data.get('id', ''),
+                'name': data.get('name', ''),
+                'description': data.get('description', ''),
+                'keywords': data.get('keywords', []),
+                'complexity': data.get('complexity', ''),
+                'file_path': file_path_rel,
+                'file_type': file_type_var,
+                'data': data,
+                'tokens': tokens,
+                'doc_length': len(tokens),
+                'checksum': zlib.crc32(' '.join(tokens).encode('utf-8'))  # Detects edits that keep the length
+            }
     
+    def fingerprint(self):
+        """Checksum of the indexed documents, used to detect stale caches"""
+        checksum = 0
+        for doc in self.index:
+            entry = f"{doc['file_path']}:{doc['id']}:{doc['doc_length']}:{doc['checksum']}\n"
+            checksum = zlib.crc32(entry.encode('utf-8'), checksum)
+        return f"{self.doc_count}-{checksum:08x}"
+
+    def warm_up(self, queries=None, save=True):
+        """
+        Precompute results for the hottest logged queries
+
+        queries: iterable of query strings (defaults to the query log's hot queries)
+        save: store the precomputed results next to the query log
+        """
+        if queries is None:
+            if self.query_log is None:
+                return
+            queries = [q for q, _ in self.query_log.hot_queries(index=self.LOG_NAME)]
+
+        self.hot_cache = {}
+        self.hot_cache_loaded = False
+        for query in queries:
+            key = QueryLog.normalize(query)
+            self.hot_cache[key] = self._rank(key, HOT_CACHE_DEPTH, BM25_K1, BM25_B, self.rerank)
+
+        if save and self.query_log is not None:
+            self.save_hot_cache(self.query_log.cache_path(self.LOG_NAME, self.rerank))
+
+    def save_hot_cache(self, path):
+        """Write precomputed hits (document positions and scores) to JSON"""
+        payload = {
+            'fingerprint': self.fingerprint(),
+            'rerank': bool(self.rerank),
+            'built': time.time(),
+            'log_state': self.query_log.state() if self.query_log is not None else None,
+            'queries': self.hot_cache
+        }
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f)
+        except OSError:
+            pass
+
+    def load_hot_cache(self, path=None):
+        """
+        Load precomputed hits if they are recent and were built from this exact index
+
+        A cache without any hot query is only trusted while the query log is
+        unchanged, so queries logged since then get analyzed on the next start.
+        """
+        if path is None:
+            if self.query_log is None:
+                return False
+            path = self.query_log.cache_path(self.LOG_NAME, self.rerank)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if payload.get('fingerprint') != self.fingerprint() or payload.get('rerank') != bool(self.rerank):
+            return False
+        if time.time() - payload.get('built', 0) > HOT_CACHE_MAX_AGE:
+            return False
+        queries = payload.get('queries', {})
+        if not queries:
+            if self.query_log is None or payload.get('log_state') != self.query_log.state():
+                return False
+        self.hot_cache = queries
+        self.hot_cache_loaded = True
+        return True
+
+    def save_index(self, path=INDEX_PATH):
+        """
+        Persist the index in compressed form, with its rerank vectors and any
+        precomputed hot queries (plain BM25 hits, plus reranked ones when this
+        searcher reranks)
+        """
+        if any(doc['tokens'] is None for doc in self.index):
+            raise ValueError("Index has no tokens to save (sharded or already compressed)")
+        if not self.doc_vectors:
+            self._build_vectors()
+
+        total_length = sum(doc['doc_length'] for doc in self.index)
+        hot_cache = {'bm25': self.hot_cache, 'rerank': {}}
+        if self.rerank:
+            hot_cache = {
+                'bm25': {
+                    query: self._rank(query, HOT_CACHE_DEPTH, BM25_K1, BM25_B, False)
+                    for query in self.hot_cache
+                },
+                'rerank': self.hot_cache
+            }
+        context_terms = sorted(self.term_context, key=self.term_context.get)
+        vectors = (self.doc_vectors, self.context_vectors, context_terms)
+        write_compressed_index(path, self.index, total_length, hot_cache, vectors)
+
+    def _build_vectors(self):
+        """Precompute hashed feature vectors for the rerank stage.
+
+        Every term is hashed (with its character trigrams) into a fixed number of
+        dimensions, and gets a context vector summing the hashed features of the
+        terms it co-occurs with. A document vector is the IDF-weighted sum of its
+        terms' own and context features, so documents sharing neighbours
+        ("endpoint" next to "controller", "rest") end up close even without
+        sharing words. Runs fully offline; no model download involved.
+        """
+        dims = RERANK_DIMENSIONS
+
+        # 1. Co-occurrence context vectors, one contiguous row per term
+        neighbours = defaultdict(Counter)
+        for doc in self.index:
+            tokens = doc['tokens']
+            for i, term in enumerate(tokens):
+                window = tokens[max(0, i - RERANK_WINDOW):i + RERANK_WINDOW + 1]
+                neighbours[term].update(window)
+
+        context = {}
+        for term, counts in neighbours.items():
+            counts.pop(term, None)
+            row = context[term] = [0.0] * dims
+            for neighbour, count in counts.items():
+                for dim, weight in self._hash_features(neighbour):
+                    row[dim] += count * weight
+
+        self.term_context = {}
+        self.context_vectors = array('f')
+        for term, row in context.items():
+            norm = sqrt(sum(v * v for v in row))
+            if norm == 0:
+                continue
+            self.term_context[term] = len(self.term_context)
+            self.context_vectors.extend(v / norm for v in row)
+
+        # 2. Document vectors, stored back to back in one float array
+        self.doc_vectors = array('f')
+        for doc in self.index:
+            self.doc_vectors.extend(self._embed(doc['tokens']))
+
+    def _hash_features(self, term):
+        """Return (dimension, signed weight) pairs for a term and its trigrams.
+
+        Uses crc32 rather than hash() so vectors are stable across processes.
+        """
+        features = self._feature_cache.get(term)
+        if features is not None:
+            return features
+        features = self._feature_cache[term] = []
+        h = zlib.crc32(term.encode('utf-8'))
+        features.append((h % RERANK_DIMENSIONS, 1.0 if h & 0x80000000 else -1.0))
+        padded = f"#{term}#"
+        for i in range(len(padded) - 2):
+            h = zlib.crc32(padded[i:i + 3].encode('utf-8'))
+            features.append((h % RERANK_DIMENSIONS, 0.5 if h & 0x80000000 else -0.5))
+        return features
+
+    def _doc_freq(self, term):
+        """Number of documents containing a term"""
+        return self.term_doc_freq.get(term, 0)
+
+    def _embed(self, tokens):
+        """Embed a token list into a unit-length vector (all zeros if empty)"""
+        dims = RERANK_DIMENSIONS
+        vector = [0.0] * dims
+        for term, tf in Counter(tokens).items():
+            df = self._doc_freq(term)
+            weight = (1.0 + log(tf)) * log((self.doc_count + 1) / (df + 0.5))
+            if weight <= 0:
+                continue
+            for dim, value in self._hash_features(term):
+                vector[dim] += weight * value
+            row = self.term_context.get(term)
+            if row is not None:
+                offset = row * dims
+                scale = weight * RERANK_CONTEXT_WEIGHT
+                vector = [v + scale * c for v, c in zip(vector, self.context_vectors[offset:offset + dims])]
+
+        norm = sqrt(sum(v * v for v in vector))
+        if norm == 0:
+            return array('f', vector)
+        return array('f', [v / norm for v in vector])
+
+    def _rerank(self, query_tokens, candidates, weight=RERANK_WEIGHT):
+        """
+        Rerank BM25 candidates by cosine similarity of their hashed vectors
+
+        candidates: list of (bm25_score, doc_position) pairs
+        Returns: list of (final_score, similarity, bm25_score, doc_position)
+        sorted by final score descending. The final score blends BM25 and
+        similarity on the BM25 scale, so quality levels still apply.
+        """
+        if not self.doc_vectors:
+            self._build_vectors()
+
+        query_vector = self._embed(query_tokens).tolist()
+        dims = RERANK_DIMENSIONS
+        vectors = self.doc_vectors
+        top_bm25 = max((score for score, _ in candidates), default=0.0) or 1.0
+
+        reranked = []
+        for bm25, pos in candidates:
+            offset = pos * dims
+            # Rows are unit length, so the dot product is the cosine similarity
+            similarity = _dot(query_vector, vectors[offset:offset + dims])
+            final = (1 - weight) * bm25 + weight * similarity * top_bm25
+            reranked.append((final, similarity, bm25, pos))
+
+        reranked.sort(key=lambda x: x[0], reverse=True)
+        return reranked
+
     def _extract_searchable_text(self, data):
         """Extract all searchable text from document"""
         text_parts = [
@@ -159,7 +529,7 @@ class KeywordSearch:
         
         return unique_keywords
     
-    def search_bm25(self, query, top_k=5, k1=1.5, b=0.75):
+    def search_bm25(self, query, top_k=5, k1=BM25_K1, b=BM25_B, rerank=None):
         """
         BM25 ranking algorithm
         
@@ -168,17 +538,48 @@ class KeywordSearch:
         - top_k: Number of results to return
         - k1: Term frequency saturation parameter (1.2-2.0)
         - b: Length normalization parameter (0.75 is standard)
+        - rerank: Rerank the top BM25 candidates by vector similarity
+                  (defaults to the value passed to the constructor)
         
         Returns: List of top matching documents with scores
         """
+        started = time.perf_counter()
+        rerank = self.rerank if rerank is None else rerank
+        key = QueryLog.normalize(query)
+        
+        # Hot queries are precomputed with default parameters: a single lookup
+        hits = None
+        if (k1, b, rerank) == (BM25_K1, BM25_B, self.rerank) and top_k <= HOT_CACHE_DEPTH:
+            hits = self.hot_cache.get(key)
+        cached = hits is not None
+        if not cached:
+            hits = self._rank(query, top_k, k1, b, rerank)
+        results = [self._hit_to_result(hit) for hit in hits[:top_k]]
+        
+        if self.query_log is not None:
+            latency_ms = (time.perf_counter() - started) * 1000
+            self.query_log.record(key, latency_ms, len(results), cached, self.LOG_NAME)
+        
+        return results
+    
+    def _rank(self, query, top_k, k1, b, rerank):
+        """
+        Rank documents for a query
+        
+        Returns: list of hits, [position, bm25_score] or, when reranked,
+        [position, rerank_score, similarity, bm25_score]
+        """
         query_keywords = self.extract_keywords_from_query(query)
         query_tokens = self._tokenize(' '.join(query_keywords))
         if not query_tokens:
             return []
         
+        if rerank:
+            return self._rank_reranked(query_tokens, top_k, k1, b)
+        
         scores = []
         
-        for doc in self.index:
+        for pos, doc in enumerate(self.index):
             score = self._calculate_bm25_score(
                 query_tokens, 
                 doc['tokens'], 
@@ -188,23 +589,51 @@ class KeywordSearch:
             )
             
             if score > 0:
-                scores.append({
-                    'id': doc['id'],
-                    'name': doc['name'],
-                    'description': doc['description'],
-                    'keywords': doc['keywords'],
-                    'complexity': doc['complexity'],
-                    'file_path': doc['file_path'],
-                    'file_type': doc['file_type'],
-                    'score': score,
-                    'data': doc['data']
-                })
+                scores.append([pos, score])
         
         # Sort by score descending
-        scores.sort(key=lambda x: x['score'], reverse=True)
+        scores.sort(key=lambda x: x[1], reverse=True)
         
         return scores[:top_k]
     
+    def _rank_reranked(self, query_tokens, top_k, k1, b):
+        """Two-stage search: BM25 candidate generation, then vector rerank"""
+        candidates = []
+        for pos, doc in enumerate(self.index):
+            score = self._calculate_bm25_score(query_tokens, doc['tokens'], doc['doc_length'], k1, b)
+            if score > 0:
+                candidates.append((score, pos))
+        candidates.sort(key=lambda x: x[0], reverse=True)
+        candidates = candidates[:max(RERANK_DEPTH, top_k)]
+
+        return [
+            [pos, final, similarity, bm25]
+            for final, similarity, bm25, pos in self._rerank(query_tokens, candidates)[:top_k]
+        ]
+    
+    def _hit_to_result(self, hit):
+        """Turn a ranked hit into the result dict returned to callers"""
+        result = self._make_result(self.index[hit[0]], hit[1])
+        if len(hit) > 2:
+            # 'score' is the rerank score that drives the order
+            result['similarity'] = hit[2]
+            result['bm25_score'] = hit[3]
+        return result
+    
+    def _make_result(self, doc, score):
+        """Build the result dict returned for a matching document"""
+        return {
+            'id': doc['id'],
+            'name': doc['name'],
+            'description': doc['description'],
+            'keywords': doc['keywords'],
+            'complexity': doc['complexity'],
+            'file_path': doc['file_path'],
+            'file_type': doc['file_type'],
+            'score': score,
+            'data': doc['data']
+        }
+    
     def _calculate_bm25_score(self, query_tokens, doc_tokens, doc_length, k1, b):
         """Calculate BM25 score for a document"""
         score = 0.0
@@ -410,35 +839,1112 @@ class KeywordSearch:
     #     return '\n'.join(output)
 
 
+class SymbolIndex(KeywordSearch):
+    """
+    Symbol-level index over the bundled code examples (code/ folder)
+
+    Extracts classes, annotations, method signatures and XML elements with
+    their line ranges, so a query returns just the matching snippet instead
+    of a whole file.
+    """
+
+    LOG_NAME = 'symbols'
+    CODE_EXTENSIONS = {'.java': 'java', '.kt': 'kotlin', '.xml': 'xml'}
+
+    # Declarations are matched on source lines with strings and comments removed
+    CLASS_RE = re.compile(r'^(?:[\w]+\s+)*(class|interface|enum|object|record)\s+(\w+)')
+    COMPANION_RE = re.compile(r'^(?:[\w]+\s+)*companion\s+object\b\s*(\w+)?')
+    KOTLIN_FUN_RE = re.compile(r'^(?:[\w]+\s+)*fun\s+(?:<[^>]*>\s*)?(?:[\w.]+\.)?(\w+|`[^`]+`)\s*\(')
+    JAVA_METHOD_RE = re.compile(
+        r'^(?:(?:public|protected|private|static|final|abstract|synchronized|default|native)\s+)*'
+        r'(?:<[^>]*>\s+)?(?:([\w.<>\[\]?, ]+?)\s+)?(\w+)\s*\('
+    )
+    LEADING_ANNOTATIONS_RE = re.compile(r'^(?:@[\w.:]+(?:\([^)]*\))?\s*)+')
+    XML_OPEN_RE = re.compile(r'<([\w:-]+)\b([^>]*?)(/?)>')
+    XML_COMMENT_RE = re.compile(r'<!--.*?-->', re.DOTALL)
+    NOT_A_METHOD = {'if', 'for', 'while', 'switch', 'catch', 'return', 'new', 'throw', 'else', 'super', 'this'}
+
+    def __init__(self, rerank=False, query_log=None):
+        self.sources = {}  # file_path -> list of source lines
+        super().__init__(rerank=rerank, query_log=query_log)
+
+    def _build_index(self):
+        """Parse every code example under code/ into symbol documents"""
+        import os
+
+        code_dir = DATA_DIR / "code"
+        all_files = []
+        if code_dir.exists():
+            for root, dirs, files in os.walk(code_dir, followlinks=True):
+                for fname in files:
+                    if Path(fname).suffix.lower() in self.CODE_EXTENSIONS:
+                        all_files.append(Path(root) / fname)
+
+        total_length = 0
+
+        for code_file in sorted(all_files):
+            language = self.CODE_EXTENSIONS[code_file.suffix.lower()]
+            with open(code_file, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+
+            try:
+                file_path_rel = str(code_file.relative_to(DATA_DIR))
+            except Exception:
+                file_path_rel = str(code_file)
+            self.sources[file_path_rel] = lines
+
+            if language == 'xml':
+                symbols = self._parse_xml(lines)
+            else:
+                symbols = self._parse_source(lines, language)
+
+            for symbol in symbols:
+                searchable = ' '.join(
+                    [symbol['name'], symbol['kind'], symbol['parent'] or '', symbol['class_name'] or '',
+                     code_file.stem, language]
+                    + symbol['annotations'] * 2
+                    + [symbol['name']]
+                    + [symbol['signature']]
+                )
+                tokens = self._tokenize_code(searchable)
+
+                doc = dict(symbol)
+                doc.update({
+                    'id': f"{file_path_rel}:{symbol['start_line']}-{symbol['end_line']}",
+                    'language': language,
+                    'file_path': file_path_rel,
+                    'tokens': tokens,
+                    'doc_length': len(tokens),
+                    'checksum': zlib.crc32(' '.join(tokens).encode('utf-8'))
+                })
+
+                self.index.append(doc)
+                total_length += len(tokens)
+
+                for term in set(tokens):
+                    self.term_doc_freq[term] += 1
+
+        self.doc_count = len(self.index)
+        self.avg_doc_length = total_length / self.doc_count if self.doc_count > 0 else 0
+
+    def _tokenize_code(self, text):
+        """Tokenize identifiers, keeping the whole word and its camelCase parts"""
+        tokens = []
+        for word in re.findall(r'\w+', text):
+            tokens.append(word.lower())
+            parts = re.findall(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+', word)
+            if len(parts) > 1:
+                tokens.extend(part.lower() for part in parts)
+        return tokens
+
+    def _strip_code(self, lines):
+        """Blank out string literals and comments so braces can be counted safely, keeping columns"""
+        clean = []
+        in_block_comment = False
+        for line in lines:
+            out = []
+            i = 0
+            while i < len(line):
+                if in_block_comment:
+                    end = line.find('*/', i)
+                    if end == -1:
+                        end = len(line)
+                    else:
+                        in_block_comment = False
+                        end += 2
+                    out.append(' ' * (end - i))
+                    i = end
+                    continue
+                ch = line[i]
+                if line.startswith('/*', i):
+                    in_block_comment = True
+                    out.append('  ')
+                    i += 2
+                elif line.startswith('//', i):
+                    break
+                elif ch in '"\'':
+                    # Skip to the closing quote, honouring escapes
+                    j = i + 1
+                    while j < len(line) and line[j] != ch:
+                        j += 2 if line[j] == '\\' else 1
+                    out.append(ch + ' ' * len(line[i + 1:j]) + line[j:j + 1])
+                    i = j + 1
+                else:
+                    out.append(ch)
+                    i += 1
+            clean.append(''.join(out))
+        return clean
+
+    def _find_end(self, clean, start):
+        """Return the last line index of the declaration starting at `start`"""
+        parens = braces = 0
+        opened = False
+        for i in range(start, len(clean)):
+            for ch in clean[i]:
+                if ch == '(':
+                    parens += 1
+                elif ch == ')':
+                    parens -= 1
+                elif ch == '{':
+                    braces += 1
+                    opened = True
+                elif ch == '}':
+                    braces -= 1
+            if opened and braces <= 0:
+                return i
+            if not opened and parens <= 0 and braces <= 0:
+                tail = clean[i].rstrip()
+                # Declaration continues on the next line (wrapped signature or body)
+                if tail.endswith((',', '(', '=', ':', '->')):
+                    continue
+                nxt = next((l.strip() for l in clean[i + 1:] if l.strip()), '')
+                if nxt.startswith(('{', ':', '=', '.', 'throws', 'where')):
+                    continue
+                return i
+        return len(clean) - 1
+
+    def _signature(self, lines, clean, start, end):
+        """Collapse the declaration header (up to the body) onto one line"""
+        parts = []
+        parens = 0
+        for i in range(start, end + 1):
+            stripped = clean[i]
+            cut = len(stripped)
+            for pos, ch in enumerate(stripped):
+                if ch == '(':
+                    parens += 1
+                elif ch == ')':
+                    parens -= 1
+                elif parens == 0 and (ch == '{' or stripped.startswith(' = ', pos)):
+                    cut = pos
+                    break
+            parts.append(lines[i][:cut].strip())
+            if cut < len(stripped):
+                break
+        return ' '.join(p for p in parts if p)
+
+    def _parse_source(self, lines, language):
+        """Extract classes and methods (with annotations) from Java/Kotlin source"""
+        clean = self._strip_code(lines)
+        symbols = []
+        class_stack = []  # (name, body_depth, end_line_index)
+        pending = []      # annotations seen right before the next declaration
+        pending_start = None
+        annotation_parens = 0  # open parens of an annotation spanning several lines
+        depth = 0
+
+        for i, line in enumerate(clean):
+            while class_stack and i > class_stack[-1][2]:
+                class_stack.pop()
+
+            stripped = line.strip()
+            member_depth = class_stack[-1][1] if class_stack else 0
+
+            if annotation_parens > 0:
+                annotation_parens += line.count('(') - line.count(')')
+            elif stripped and depth == member_depth:
+                match = self.LEADING_ANNOTATIONS_RE.match(stripped)
+                if match:
+                    if pending_start is None:
+                        pending_start = i
+                    pending.extend(a.split(':')[-1] for a in re.findall(r'@([\w.:]+)', match.group(0)))
+                    stripped = stripped[match.end():].strip()
+                    if stripped.startswith('('):
+                        # Arguments of the last annotation continue on the next lines
+                        annotation_parens = stripped.count('(') - stripped.count(')')
+                        stripped = ''
+
+                if stripped:
+                    kind, name = self._match_declaration(stripped, language, class_stack)
+                    if name:
+                        end = self._find_end(clean, i)
+                        start = pending_start if pending_start is not None else i
+                        symbols.append({
+                            'name': name,
+                            'kind': kind,
+                            'annotations': pending,
+                            'class_name': None,
+                            'signature': self._signature(lines, clean, i, end),
+                            'parent': class_stack[-1][0] if class_stack else None,
+                            'start_line': start + 1,
+                            'end_line': end + 1
+                        })
+                        if kind != 'method':
+                            class_stack.append((name, depth + 1, end))
+                    pending = []
+                    pending_start = None
+
+            depth += line.count('{') - line.count('}')
+
+        return symbols
+
+    def _match_declaration(self, stripped, language, class_stack):
+        """Return (kind, name) if the line declares a class or method"""
+        if language == 'kotlin':
+            # `companion object` may omit its name, which then defaults to Companion
+            match = self.COMPANION_RE.match(stripped)
+            if match:
+                return 'object', match.group(1) or 'Companion'
+        match = self.CLASS_RE.match(stripped)
+        if match:
+            return match.group(1), match.group(2)
+        if language == 'kotlin':
+            match = self.KOTLIN_FUN_RE.match(stripped)
+            if match:
+                return 'method', match.group(1).strip('`')
+        elif class_stack and '=' not in stripped.split('(', 1)[0]:
+            match = self.JAVA_METHOD_RE.match(stripped)
+            if match:
+                return_type, name = match.group(1), match.group(2)
+                first_word = (return_type or name).split()[0]
+                if first_word not in self.NOT_A_METHOD and name not in self.NOT_A_METHOD:
+                    # A name-only match is a constructor of the enclosing class
+                    if return_type or name == class_stack[-1][0]:
+                        return 'method', name
+        return None, None
+
+    def _parse_xml(self, lines):
+        """Extract named XML elements (appenders, loggers, root) with their line ranges"""
+        # Blank out comments but keep their newlines so offsets still map to lines
+        text = self.XML_COMMENT_RE.sub(lambda m: re.sub(r'[^\n]', ' ', m.group(0)), '\n'.join(lines))
+        newlines = [i for i, ch in enumerate(text) if ch == '\n']
+
+        symbols = []
+        for match in self.XML_OPEN_RE.finditer(text):
+            tag, attrs, self_closing = match.groups()
+            name = re.search(r'\bname="([^"]*)"', attrs)
+            if not name and tag != 'root':
+                continue
+            class_name = re.search(r'\bclass="([^"]*)"', attrs)
+            end = match.end() if self_closing else self._find_xml_end(text, match.end(), tag)
+            symbols.append({
+                'name': name.group(1) if name else tag,
+                'kind': tag,
+                'annotations': [],
+                'class_name': class_name.group(1) if class_name else None,
+                'signature': ' '.join(match.group(0).split()),
+                'parent': None,
+                'start_line': bisect.bisect_left(newlines, match.start()) + 1,
+                'end_line': bisect.bisect_left(newlines, end - 1) + 1
+            })
+        return symbols
+
+    def _find_xml_end(self, text, offset, tag):
+        """Return the offset just past the tag closing the element opened before `offset`"""
+        depth = 1
+        events = re.compile(rf'<{re.escape(tag)}\b[^>]*?(/?)>|</{re.escape(tag)}\s*>')
+        for match in events.finditer(text, offset):
+            if match.group(0).startswith('</'):
+                depth -= 1
+            elif not match.group(1):
+                depth += 1
+            if depth == 0:
+                return match.end()
+        return len(text)
+
+    def _make_result(self, doc, score):
+        """Build the result dict for a matching symbol, including its source lines"""
+        return {
+            'id': doc['id'],
+            'name': doc['name'],
+            'kind': doc['kind'],
+            'annotations': doc['annotations'],
+            'class_name': doc['class_name'],
+            'signature': doc['signature'],
+            'parent': doc['parent'],
+            'language': doc['language'],
+            'file_path': doc['file_path'],
+            'start_line': doc['start_line'],
+            'end_line': doc['end_line'],
+            'score': score,
+            'snippet': self.read_snippet(doc)
+        }
+
+    def read_snippet(self, symbol):
+        """Return only the source lines covered by a symbol"""
+        lines = self.sources.get(symbol['file_path'], [])
+        return '\n'.join(lines[symbol['start_line'] - 1:symbol['end_line']])
+
+    def format_results(self, results, query):
+        """Format symbol search results with their snippets"""
+        if not results:
+            return f"❌ No matching symbols found for: \"{query}\""
+
+        output = []
+        output.append("=" * 70)
+        output.append(f"🔍 SYMBOL RESULTS FOR: \"{query}\"")
+        output.append("=" * 70)
+
+        for i, result in enumerate(results, 1):
+            annotations = ' '.join(f"@{a}" for a in result['annotations'])
+            output.append("-" * 70)
+            output.append(f"#{i} {result['kind']} {result['name']}  ({result['score']:.2f})")
+            output.append("-" * 70)
+            output.append(f"File:        {result['file_path']}:{result['start_line']}-{result['end_line']}")
+            if result['parent']:
+                output.append(f"In:          {result['parent']}")
+            if annotations:
+                output.append(f"Annotations: {annotations}")
+            if result['class_name']:
+                output.append(f"Class:       {result['class_name']}")
+            output.append(f"Signature:   {result['signature']}")
+            output.append("")
+            output.append(result['snippet'])
+
+        return "\n".join(output)
+
+
+class IndexShard:
+    """Postings and local statistics for one slice of the documents"""
+
+    def __init__(self, docs=()):
+        """docs: iterable of (global_position, tokens)"""
+        self.postings = defaultdict(list)  # term -> [(global_position, tf)]
+        self.doc_lengths = {}
+        self.total_length = 0
+        self.doc_count = 0
+        self.add(docs)
+
+    def add(self, docs):
+        """Index more (global_position, tokens) pairs; positions must increase"""
+        for pos, tokens in docs:
+            for term, tf in Counter(tokens).items():
+                self.postings[term].append((pos, tf))
+            self.doc_lengths[pos] = len(tokens)
+            self.total_length += len(tokens)
+        self.doc_count = len(self.doc_lengths)
+
+    def stats(self):
+        """Local document count and total length, for the global average length"""
+        return self.doc_count, self.total_length
+
+    def doc_freqs(self, terms):
+        """Local document frequency of each term"""
+        return [len(self.postings.get(term, ())) for term in terms]
+
+    def search(self, terms, idfs, avg_doc_length, k1, b, top_k):
+        """
+        Score local documents with global IDF and average length
+
+        Terms are added in the order given so per-document sums match
+        KeywordSearch._calculate_bm25_score exactly.
+        Returns: up to top_k (global_position, score) pairs, best first
+        """
+        scores = {}
+        for term, idf in zip(terms, idfs):
+            if idf is None:
+                continue
+            for pos, tf in self.postings.get(term, ()):
+                length_norm = 1 - b + b * (self.doc_lengths[pos] / avg_doc_length)
+                term_score = idf * (tf * (k1 + 1)) / (tf + k1 * length_norm)
+                scores[pos] = scores.get(pos, 0.0) + term_score
+
+        best = heapq.nsmallest(top_k, ((-score, pos) for pos, score in scores.items() if score > 0))
+        return [(pos, -neg_score) for neg_score, pos in best]
+
+
+def _serve_shard(conn, shard):
+    """Worker process loop: answer (command, args) messages until None arrives"""
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        command, args = message
+        try:
+            conn.send((True, getattr(shard, command)(*args)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+    conn.close()
+
+
+class ShardedKeywordSearch(KeywordSearch):
+    """
+    KeywordSearch split into N shards served by worker processes
+
+    Each shard keeps its own postings and local statistics. A query is
+    scatter-gathered twice: first to reconcile global document frequencies,
+    then to score with global IDF and average length. Per-shard top-k lists
+    are merged, giving exactly the results of the unsharded search_bm25.
+    """
+
+    def __init__(self, num_shards=None, processes=True, query_log=None):
+        """
+        num_shards: number of shards (defaults to the CPU count)
+        processes: serve shards from worker processes; False keeps them in-process
+        """
+        import os
+
+        self.num_shards = max(1, num_shards or os.cpu_count() or 1)
+        self.processes = processes
+        self.shards = []
+        self._workers = []
+        self._conns = []
+        super().__init__(rerank=False, query_log=query_log)
+
+    def _build_index(self):
+        """
+        Stream documents straight into the shards
+
+        The coordinator never holds token lists or postings: each document's
+        tokens go to its shard in batches, and its 'data' is dropped and
+        reloaded from file only for returned results.
+        """
+        self.shards = [IndexShard() for _ in range(self.num_shards)]
+        if self.processes:
+            self._start_workers()
+
+        batches = [[] for _ in range(self.num_shards)]
+        for pos, doc in enumerate(self._iter_documents()):
+            shard = pos % self.num_shards
+            batches[shard].append((pos, doc['tokens']))
+            doc['tokens'] = None  # Postings live in the shards only
+            del doc['data']
+            self.index.append(doc)
+            if len(batches[shard]) >= SHARD_BATCH_SIZE:
+                self._send(shard, 'add', batches[shard])
+                batches[shard] = []
+        for shard, batch in enumerate(batches):
+            if batch:
+                self._send(shard, 'add', batch)
+
+        # Global statistics from the shards' local ones
+        stats = self._scatter('stats')
+        self.doc_count = sum(count for count, _ in stats)
+        total_length = sum(length for _, length in stats)
+        self.avg_doc_length = total_length / self.doc_count if self.doc_count > 0 else 0
+
+    def _start_workers(self):
+        """Start one worker process per (still empty) shard"""
+        import multiprocessing
+
+        for shard in self.shards:
+            parent_conn, child_conn = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=_serve_shard, args=(child_conn, shard), daemon=True)
+            worker.start()
+            child_conn.close()
+            self._workers.append(worker)
+            self._conns.append(parent_conn)
+        self.shards = []
+
+    def _send(self, shard, command, *args):
+        """Run a command on a single shard and return its reply"""
+        if not self._conns:
+            return getattr(self.shards[shard], command)(*args)
+        self._post(shard, command, args)
+        return self._receive(shard, command)
+
+    def _scatter(self, command, *args):
+        """Send a command to every shard at once, then gather the replies in order"""
+        if not self._conns:
+            return [getattr(shard, command)(*args) for shard in self.shards]
+
+        for shard in range(len(self._conns)):
+            self._post(shard, command, args)
+        return [self._receive(shard, command) for shard in range(len(self._conns))]
+
+    def _post(self, shard, command, args):
+        """Send a command to a worker, reporting a dead worker as a shard failure"""
+        try:
+            self._conns[shard].send((command, args))
+        except (OSError, EOFError) as e:
+            raise RuntimeError(f"Shard {shard} failed on '{command}': worker is gone ({e!r})") from e
+
+    def _receive(self, shard, command):
+        """Wait for a worker's reply to a command"""
+        try:
+            ok, value = self._conns[shard].recv()
+        except (OSError, EOFError) as e:
+            raise RuntimeError(f"Shard {shard} failed on '{command}': worker is gone ({e!r})") from e
+        if not ok:
+            raise RuntimeError(f"Shard {shard} failed on '{command}': {value}")
+        return value
+
+    def _rank(self, query, top_k, k1, b, rerank):
+        """Scatter-gather BM25 ranking"""
+        if rerank:
+            raise ValueError("Rerank is not available on a sharded index")
+        query_keywords = self.extract_keywords_from_query(query)
+        query_tokens = self._tokenize(' '.join(query_keywords))
+        if not query_tokens or self.doc_count == 0:
+            return []
+
+        # Same term order as _calculate_bm25_score, so float sums are identical
+        terms = list(set(query_tokens))
+
+        # Phase 1: reconcile global document frequencies
+        doc_freqs = [sum(dfs) for dfs in zip(*self._scatter('doc_freqs', terms))]
+        idfs = [
+            log((self.doc_count - df + 0.5) / (df + 0.5) + 1.0) if df else None
+            for df in doc_freqs
+        ]
+
+        # Phase 2: score on every shard, merge the per-shard top-k lists
+        shard_hits = self._scatter('search', terms, idfs, self.avg_doc_length, k1, b, top_k)
+        merged = heapq.merge(*shard_hits, key=lambda hit: (-hit[1], hit[0]))
+        return [[pos, score] for pos, score in islice(merged, top_k)]
+
+    def _make_result(self, doc, score):
+        """Reload the document's JSON, which the coordinator does not keep"""
+        with open(DATA_DIR / doc['file_path'], 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return super()._make_result(dict(doc, data=data), score)
+
+    def close(self):
+        """Stop the worker processes"""
+        for conn in self._conns:
+            try:
+                conn.send(None)
+                conn.close()
+            except OSError:
+                pass
+        for worker in self._workers:
+            worker.join(timeout=1)
+        self._conns = []
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def encode_varint(value, out):
+    """Append an unsigned LEB128 varint to a bytearray"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(buf, offset):
+    """Read an unsigned LEB128 varint; returns (value, next_offset)"""
+    byte = buf[offset]
+    if byte < 0x80:
+        return byte, offset + 1
+    value = byte & 0x7F
+    shift = 7
+    while True:
+        offset += 1
+        byte = buf[offset]
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset + 1
+        shift += 7
+
+
+def _encode_bytes(data, out):
+    encode_varint(len(data), out)
+    out.extend(data)
+
+
+def _decode_bytes(buf, offset):
+    length, offset = decode_varint(buf, offset)
+    return buf[offset:offset + length], offset + length
+
+
+def _shared_prefix(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def write_compressed_index(path, index, total_length, hot_cache=None, vectors=None):
+    """
+    Write documents and their postings in the compressed on-disk format
+
+    Layout: MAGIC, varint-prefixed JSON header, then four sections whose
+    lengths are in the header:
+    - docs:        zlib-compressed JSON of the document metadata
+    - vocab index: first term and byte offset of every vocabulary block
+    - vocab:       sorted terms, front-coded in blocks of INDEX_VOCAB_BLOCK;
+                   each term is followed by its df and postings offset
+    - postings:    per term, the block count and byte length of its skip table,
+                   the skip table (last doc id delta, byte length per block),
+                   then blocks of INDEX_POSTING_BLOCK (doc id delta, tf) varint
+                   pairs; doc id deltas run on across block boundaries
+
+    vectors: optional (doc_vectors, context_vectors, context_terms) for the
+    rerank stage, appended as raw float arrays plus the zlib-compressed JSON
+    list of terms in context row order.
+    """
+    postings = defaultdict(list)
+    docs = []
+    for pos, doc in enumerate(index):
+        if doc['tokens'] is None:
+            raise ValueError("Index has no tokens to save (sharded or already compressed)")
+        for term, tf in Counter(doc['tokens']).items():
+            postings[term].append((pos, tf))
+        docs.append({k: v for k, v in doc.items() if k != 'tokens'})
+
+    postings_section = bytearray()
+    vocab_section = bytearray()
+    vocab_index = bytearray()
+    terms = sorted(postings)
+
+    for i, term in enumerate(terms):
+        term_bytes = term.encode('utf-8')
+        if i % INDEX_VOCAB_BLOCK == 0:
+            _encode_bytes(term_bytes, vocab_index)
+            encode_varint(len(vocab_section), vocab_index)
+            _encode_bytes(term_bytes, vocab_section)
+        else:
+            shared = _shared_prefix(prev_bytes, term_bytes)
+            encode_varint(shared, vocab_section)
+            _encode_bytes(term_bytes[shared:], vocab_section)
+        prev_bytes = term_bytes
+
+        entries = postings[term]
+        encode_varint(len(entries), vocab_section)
+        encode_varint(len(postings_section), vocab_section)
+
+        # Skip table first, so a reader can jump over whole blocks
+        blocks = []
+        prev_doc = 0
+        for start in range(0, len(entries), INDEX_POSTING_BLOCK):
+            block = bytearray()
+            block_first = prev_doc
+            for pos, tf in entries[start:start + INDEX_POSTING_BLOCK]:
+                encode_varint(pos - prev_doc, block)
+                encode_varint(tf, block)
+                prev_doc = pos
+            blocks.append((prev_doc - block_first, block))
+        skip_table = bytearray()
+        for last_delta, block in blocks:
+            encode_varint(last_delta, skip_table)
+            encode_varint(len(block), skip_table)
+        encode_varint(len(blocks), postings_section)
+        _encode_bytes(skip_table, postings_section)
+        for _, block in blocks:
+            postings_section.extend(block)
+
+    docs_section = zlib.compress(json.dumps(docs, separators=(',', ':')).encode('utf-8'))
+    header = {
+        'version': 1,
+        'doc_count': len(index),
+        'total_length': total_length,
+        'term_count': len(terms),
+        'sections': [len(docs_section), len(vocab_index), len(vocab_section), len(postings_section)],
+        'hot_cache': hot_cache or {}
+    }
+    sections = [docs_section, vocab_index, vocab_section, postings_section]
+
+    if vectors is not None:
+        doc_vectors, context_vectors, context_terms = vectors
+        vector_sections = [
+            doc_vectors.tobytes(),
+            context_vectors.tobytes(),
+            zlib.compress(json.dumps(context_terms, separators=(',', ':')).encode('utf-8'))
+        ]
+        header['vectors'] = {
+            'dims': RERANK_DIMENSIONS,
+            'byteorder': sys.byteorder,
+            'sections': [len(section) for section in vector_sections]
+        }
+        sections.extend(vector_sections)
+
+    out = bytearray(INDEX_MAGIC)
+    _encode_bytes(json.dumps(header, separators=(',', ':')).encode('utf-8'), out)
+    for section in sections:
+        out.extend(section)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+class CompressedIndex(KeywordSearch):
+    """
+    KeywordSearch served from a compressed index file
+
+    Loads only the header, document metadata and the vocabulary block index;
+    postings are decoded from the file bytes on demand. Produces exactly the
+    results of KeywordSearch.search_bm25 on the index it was saved from. With
+    rerank=True the saved vectors are loaded instead of being rebuilt.
+    """
+
+    def __init__(self, path, rerank=False, query_log=None):
+        self.path = Path(path)
+        super().__init__(rerank=rerank, query_log=query_log)
+
+    def _build_index(self):
+        """Read the index file (replaces parsing patterns/tasks JSON)"""
+        with open(self.path, 'rb') as f:
+            buf = f.read()
+        if not buf.startswith(INDEX_MAGIC):
+            raise ValueError(f"Not a compressed index file: {self.path}")
+
+        header_bytes, offset = _decode_bytes(buf, len(INDEX_MAGIC))
+        header = json.loads(header_bytes)
+        docs_len, vocab_index_len, vocab_len, postings_len = header['sections']
+
+        self.index = json.loads(zlib.decompress(buf[offset:offset + docs_len]))
+        for doc in self.index:
+            doc['tokens'] = None
+        offset += docs_len
+
+        # Vocabulary block index: first term of each block, for binary search
+        self._block_terms = []
+        self._block_offsets = []
+        end = offset + vocab_index_len
+        while offset < end:
+            term, offset = _decode_bytes(buf, offset)
+            block_offset, offset = decode_varint(buf, offset)
+            self._block_terms.append(term.decode('utf-8'))
+            self._block_offsets.append(block_offset)
+
+        self._vocab_start = end
+        self._postings_start = end + vocab_len
+        self._buf = buf
+        self.term_count = header['term_count']
+        self.doc_count = header['doc_count']
+        self.avg_doc_length = header['total_length'] / self.doc_count if self.doc_count > 0 else 0
+        self.hot_cache = header.get('hot_cache', {}).get('rerank' if self.rerank else 'bm25', {})
+
+        vectors = header.get('vectors')
+        if self.rerank and vectors is not None:
+            if vectors['dims'] != RERANK_DIMENSIONS:
+                raise ValueError(f"Index vectors have {vectors['dims']} dimensions, expected {RERANK_DIMENSIONS}")
+            offset = self._postings_start + postings_len
+            doc_len, context_len, terms_len = vectors['sections']
+            self.doc_vectors = array('f', buf[offset:offset + doc_len])
+            offset += doc_len
+            self.context_vectors = array('f', buf[offset:offset + context_len])
+            offset += context_len
+            context_terms = json.loads(zlib.decompress(buf[offset:offset + terms_len]))
+            self.term_context = {term: row for row, term in enumerate(context_terms)}
+            if vectors['byteorder'] != sys.byteorder:
+                self.doc_vectors.byteswap()
+                self.context_vectors.byteswap()
+
+    def _build_vectors(self):
+        raise ValueError(f"{self.path} was saved without rerank vectors")
+
+    def _doc_freq(self, term):
+        entry = self.lookup(term)
+        return entry[0] if entry is not None else 0
+
+    def lookup(self, term):
+        """Return (df, postings_offset) for a term, or None if it is not indexed"""
+        from bisect import bisect_right
+
+        block = bisect_right(self._block_terms, term) - 1
+        if block < 0:
+            return None
+
+        buf = self._buf
+        offset = self._vocab_start + self._block_offsets[block]
+        first = block * INDEX_VOCAB_BLOCK
+        prev = b''
+        target = term.encode('utf-8')
+        for i in range(first, min(first + INDEX_VOCAB_BLOCK, self.term_count)):
+            if i == first:
+                current, offset = _decode_bytes(buf, offset)
+            else:
+                shared, offset = decode_varint(buf, offset)
+                suffix, offset = _decode_bytes(buf, offset)
+                current = prev[:shared] + suffix
+            df, offset = decode_varint(buf, offset)
+            postings_offset, offset = decode_varint(buf, offset)
+            if current == target:
+                return df, self._postings_start + postings_offset
+            if current > target:
+                return None
+            prev = current
+        return None
+
+    def iter_postings(self, entry, min_pos=0):
+        """
+        Yield (doc_position, tf) for a term's postings with position >= min_pos
+
+        With min_pos > 0 the skip table is used to jump straight to the first
+        block that can hold min_pos (e.g. when scoring a known set of
+        candidates). Full BM25 queries pass min_pos=0: they read every posting,
+        so the skip table is stepped over without being decoded.
+        """
+        buf = self._buf
+        df, offset = entry
+        block_count, offset = decode_varint(buf, offset)
+        skip_length, offset = decode_varint(buf, offset)
+
+        if min_pos <= 0:
+            offset += skip_length
+            pos = 0
+            for _ in range(df):
+                delta, offset = decode_varint(buf, offset)
+                tf, offset = decode_varint(buf, offset)
+                pos += delta
+                yield pos, tf
+            return
+
+        skips = []
+        for _ in range(block_count):
+            last_delta, offset = decode_varint(buf, offset)
+            length, offset = decode_varint(buf, offset)
+            skips.append((last_delta, length))
+
+        prev_doc = 0
+        for last_delta, length in skips:
+            block_last = prev_doc + last_delta
+            if block_last < min_pos:
+                prev_doc = block_last
+                offset += length
+                continue
+            end = offset + length
+            pos = prev_doc
+            while offset < end:
+                delta, offset = decode_varint(buf, offset)
+                tf, offset = decode_varint(buf, offset)
+                pos += delta
+                if pos >= min_pos:
+                    yield pos, tf
+            prev_doc = block_last
+
+    def _rank(self, query, top_k, k1, b, rerank):
+        """Term-at-a-time BM25 over decoded postings, optionally reranked"""
+        if rerank and not self.doc_vectors:
+            raise ValueError("Load the index with rerank=True to rerank")
+        query_keywords = self.extract_keywords_from_query(query)
+        query_tokens = self._tokenize(' '.join(query_keywords))
+        if not query_tokens or self.doc_count == 0:
+            return []
+
+        # Same term order as _calculate_bm25_score, so float sums are identical
+        scores = {}
+        for term in set(query_tokens):
+            entry = self.lookup(term)
+            if entry is None:
+                continue
+            df = entry[0]
+            idf = log((self.doc_count - df + 0.5) / (df + 0.5) + 1.0)
+            for pos, tf in self.iter_postings(entry):
+                length_norm = 1 - b + b * (self.index[pos]['doc_length'] / self.avg_doc_length)
+                term_score = idf * (tf * (k1 + 1)) / (tf + k1 * length_norm)
+                scores[pos] = scores.get(pos, 0.0) + term_score
+
+        if rerank:
+            # Same candidates, in the same order, as KeywordSearch._rank_reranked
+            best = heapq.nsmallest(max(RERANK_DEPTH, top_k), ((-score, pos) for pos, score in scores.items() if score > 0))
+            candidates = [(-neg_score, pos) for neg_score, pos in best]
+            return [
+                [pos, final, similarity, bm25]
+                for final, similarity, bm25, pos in self._rerank(query_tokens, candidates)[:top_k]
+            ]
+
+        best = heapq.nsmallest(top_k, ((-score, pos) for pos, score in scores.items() if score > 0))
+        return [[pos, -neg_score] for neg_score, pos in best]
+
+
+def _write_uncompressed_index(path, index, total_length):
+    """Benchmark baseline: the same postings and vocabulary as plain JSON"""
+    postings = defaultdict(list)
+    docs = []
+    for pos, doc in enumerate(index):
+        for term, tf in Counter(doc['tokens']).items():
+            postings[term].extend((pos, tf))  # Flat [doc id, tf, doc id, tf, ...]
+        docs.append({k: v for k, v in doc.items() if k != 'tokens'})
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'doc_count': len(index),
+            'total_length': total_length,
+            'docs': docs,
+            'postings': postings
+        }, f, separators=(',', ':'))
+
+
+class _UncompressedIndex(CompressedIndex):
+    """Benchmark baseline: CompressedIndex's query loop over plain JSON postings"""
+
+    def _build_index(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        self.index = payload['docs']
+        for doc in self.index:
+            doc['tokens'] = None
+        self._postings = payload['postings']
+        self.term_count = len(self._postings)
+        self.doc_count = payload['doc_count']
+        self.avg_doc_length = payload['total_length'] / self.doc_count if self.doc_count > 0 else 0
+
+    def lookup(self, term):
+        postings = self._postings.get(term)
+        return None if postings is None else (len(postings) // 2, postings)
+
+    def iter_postings(self, entry, min_pos=0):
+        postings = entry[1]
+        for i in range(0, len(postings), 2):
+            if postings[i] >= min_pos:
+                yield postings[i], postings[i + 1]
+
+
+def benchmark_index(searcher, queries, directory, repeat=5):
+    """
+    Compare the compressed index against an uncompressed baseline
+
+    The baseline holds the same postings and vocabulary as plain JSON (a dict
+    of flat [doc id, tf, ...] lists) and is loaded and queried through the same
+    term-at-a-time loop, so the numbers isolate the encoding. Returns file size
+    (bytes), load time and mean query time (ms) for both, plus whether they
+    produce identical results.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    baseline_path = directory / "index.json"
+    compressed_path = directory / "index.bin"
+
+    total_length = sum(doc['doc_length'] for doc in searcher.index)
+    _write_uncompressed_index(baseline_path, searcher.index, total_length)
+    write_compressed_index(compressed_path, searcher.index, total_length)
+
+    def timed(fn):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            value = fn()
+            best = min(best, time.perf_counter() - started)
+        return value, best * 1000
+
+    baseline, baseline_load = timed(lambda: _UncompressedIndex(baseline_path))
+    compressed, compressed_load = timed(lambda: CompressedIndex(compressed_path))
+
+    def run_queries(index):
+        # Rank directly so neither side answers from a hot-query cache
+        return [index._rank(q, 10, BM25_K1, BM25_B, False) for q in queries]
+
+    baseline_results, baseline_query = timed(lambda: run_queries(baseline))
+    compressed_results, compressed_query = timed(lambda: run_queries(compressed))
+    per_query = max(1, len(queries))
+
+    return {
+        'documents': searcher.doc_count,
+        'terms': compressed.term_count,
+        'baseline': {
+            'size_bytes': baseline_path.stat().st_size,
+            'load_ms': baseline_load,
+            'query_ms': baseline_query / per_query
+        },
+        'compressed': {
+            'size_bytes': compressed_path.stat().st_size,
+            'load_ms': compressed_load,
+            'query_ms': compressed_query / per_query
+        },
+        'identical': baseline_results == compressed_results
+    }
+
+
 if __name__ == "__main__":
     import argparse
     
     parser = argparse.ArgumentParser(description="Keyword-Based Pattern/Task Search")
-    parser.add_argument("query", help="Search query")
+    parser.add_argument("query", nargs="?", help="Search query")
     parser.add_argument("--top", type=int, default=5, help="Number of results (default: 5)")
     # parser.add_argument("--mode", choices=['summary', 'full'], default='summary', 
     #                    help="Output mode")
     parser.add_argument("--json", action="store_true", help="Output as JSON")
     parser.add_argument("--show-keywords", action="store_true", 
                        help="Show extracted keywords from query")
+    parser.add_argument("--rerank", action="store_true",
+                       help="Rerank BM25 candidates by hashed-feature vector similarity")
+    parser.add_argument("--symbols", action="store_true",
+                       help="Search classes, annotations and methods in code examples")
+    parser.add_argument("--shards", type=int,
+                       help="Split the index into N shards searched by worker processes")
+    parser.add_argument("--log-queries", action="store_true",
+                       help=f"Log queries and latencies to {QUERY_LOG_PATH.relative_to(DATA_DIR)} "
+                            "and answer hot queries from the precomputed cache")
+    parser.add_argument("--query-stats", action="store_true",
+                       help="Show hot queries and latency percentiles from the query log")
+    parser.add_argument("--warm-up", action="store_true",
+                       help="Precompute results for the hottest logged queries")
+    parser.add_argument("--index", metavar="PATH",
+                       help="Search a compressed index file instead of parsing patterns/tasks")
+    parser.add_argument("--save-index", metavar="PATH", nargs="?", const=str(INDEX_PATH),
+                       help=f"Save the compressed index (default: {INDEX_PATH.name})")
+    parser.add_argument("--benchmark-index", action="store_true",
+                       help="Compare compressed index size, load and query time with an uncompressed baseline")
     
     args = parser.parse_args()
+    if args.shards is not None and args.shards < 1:
+        parser.error("--shards must be at least 1")
+    if args.shards and (args.symbols or args.rerank):
+        parser.error("--shards cannot be combined with --symbols or --rerank")
+    if args.index and (args.symbols or args.shards):
+        parser.error("--index cannot be combined with --symbols or --shards")
+    if (args.save_index or args.benchmark_index) and (args.symbols or args.shards or args.index):
+        parser.error("--save-index and --benchmark-index work on the default pattern/task index")
     
-    # Initialize search
-    searcher = KeywordSearch()
+    index_class = SymbolIndex if args.symbols else KeywordSearch
+    query_log = QueryLog() if (args.log_queries or args.query_stats or args.warm_up) else None
     
-    # Show extracted keywords if requested
-    if args.show_keywords:
-        keywords = searcher.extract_keywords_from_query(args.query)
-        print(f"Extracted keywords: {keywords}\n")
+    if args.query_stats:
+        stats = {
+            'hot_queries': query_log.hot_queries(index=index_class.LOG_NAME),
+            'latency_ms': query_log.latency_percentiles(index=index_class.LOG_NAME)
+        }
+        if args.json:
+            print(json.dumps(stats, indent=2))
+        else:
+            print("🔥 Hot queries:")
+            for query, count in stats['hot_queries']:
+                print(f"   {count:>5}  {query}")
+            print("⏱️  Latency: " + ", ".join(f"{p} {ms:.2f} ms" for p, ms in stats['latency_ms'].items()))
     
-    # Search
-    results = searcher.search_bm25(args.query, top_k=args.top)
+    index_commands = args.warm_up or args.save_index or args.benchmark_index
+    if args.query is None and not index_commands:
+        if not args.query_stats:
+            parser.error("the following arguments are required: query")
+        raise SystemExit(0)
     
-    # Output
-    if args.json:
-        # Remove 'data' field for cleaner JSON output
-        clean_results = [{k: v for k, v in r.items() if k != 'data'} for r in results]
-        print(json.dumps(clean_results, indent=2))
+    # Initialize search
+    if args.index:
+        searcher = CompressedIndex(args.index, rerank=args.rerank, query_log=query_log)
+    elif args.shards:
+        searcher = ShardedKeywordSearch(num_shards=args.shards, query_log=query_log)
     else:
-        print(searcher.format_results(results, args.query))
+        searcher = index_class(rerank=args.rerank, query_log=query_log)
+    if args.warm_up and searcher.hot_cache_loaded:
+        # The constructor only warms up when no usable saved cache exists
+        searcher.warm_up()
+    
+    if args.save_index:
+        searcher.save_index(args.save_index)
+        print(f"💾 Saved compressed index to {args.save_index}")
+    
+    if args.benchmark_index:
+        import tempfile
+        
+        queries = [q for q, _ in query_log.hot_queries()] if query_log else []
+        queries = queries or ["create crud api", "add pagination", "add jwt authentication",
+                              "controller service repository", "database configuration"]
+        with tempfile.TemporaryDirectory() as tmp:
+            report = benchmark_index(searcher, queries, tmp)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print(f"📦 {report['documents']} documents, {report['terms']} terms, {len(queries)} queries")
+            print(f"   {'':<12} {'size':>12} {'load':>12} {'query':>12}")
+            for name in ('baseline', 'compressed'):
+                row = report[name]
+                print(f"   {name:<12} {row['size_bytes']:>10} B {row['load_ms']:>9.2f} ms {row['query_ms']:>9.3f} ms")
+            print(f"   Identical results: {'yes' if report['identical'] else 'NO'}")
+    
+    if args.query is not None:
+        # Show extracted keywords if requested
+        if args.show_keywords:
+            keywords = searcher.extract_keywords_from_query(args.query)
+            print(f"Extracted keywords: {keywords}\n")
+        
+        # Search
+        results = searcher.search_bm25(args.query, top_k=args.top)
+        
+        # Output
+        if args.json:
+            # Remove 'data' field for cleaner JSON output
+            clean_results = [{k: v for k, v in r.items() if k != 'data'} for r in results]
+            print(json.dumps(clean_results, indent=2))
+        else:
+            print(searcher.format_results(results, args.query))
+    
+    if args.shards:
+        searcher.close()
@@ -0,0 +1,120 @@
+"""Compressed index encoding, lookup and search equivalence"""
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from coding_agent import search_engine
+from coding_agent.search_engine import (
+    CompressedIndex,
+    KeywordSearch,
+    QueryLog,
+    decode_varint,
+    encode_varint,
+)
+
+from test_sharded_search import QUERIES, ranking, write_library
+
+
+class VarintTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        values = [0, 1, 127, 128, 255, 300, 16383, 16384, 2 ** 32 - 1, 2 ** 63]
+        buf = bytearray()
+        for value in values:
+            encode_varint(value, buf)
+
+        decoded = []
+        offset = 0
+        while offset < len(buf):
+            value, offset = decode_varint(buf, offset)
+            decoded.append(value)
+        self.assertEqual(decoded, values)
+
+    def test_small_values_take_one_byte(self):
+        buf = bytearray()
+        encode_varint(127, buf)
+        self.assertEqual(len(buf), 1)
+
+
+class CompressedIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        # Enough documents for several posting blocks per common term
+        write_library(self.tmp, count=600)
+        patcher = mock.patch.object(search_engine, 'DATA_DIR', self.tmp)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.searcher = KeywordSearch()
+        self.path = self.tmp / "index.bin"
+        self.searcher.save_index(self.path)
+        self.compressed = CompressedIndex(self.path)
+
+    def test_results_match_search_bm25(self):
+        for query in QUERIES:
+            for top_k in (1, 5, 50):
+                self.assertEqual(
+                    ranking(self.compressed.search_bm25(query, top_k=top_k)),
+                    ranking(self.searcher.search_bm25(query, top_k=top_k)),
+                    f"{query!r} top_k={top_k}"
+                )
+
+    def test_lookup_finds_every_term_with_its_df(self):
+        self.assertEqual(self.compressed.term_count, len(self.searcher.term_doc_freq))
+        for term, df in self.searcher.term_doc_freq.items():
+            entry = self.compressed.lookup(term)
+            self.assertIsNotNone(entry, term)
+            self.assertEqual(entry[0], df, term)
+
+    def test_lookup_misses(self):
+        terms = sorted(self.searcher.term_doc_freq)
+        self.assertIsNone(self.compressed.lookup(""))
+        self.assertIsNone(self.compressed.lookup(terms[0][:-1] or "\x00"))  # Before the first term
+        self.assertIsNone(self.compressed.lookup(terms[-1] + "zzz"))       # After the last term
+        self.assertIsNone(self.compressed.lookup(terms[len(terms) // 2] + "0"))  # Inside a block
+
+    def test_iter_postings_matches_tokens(self):
+        for term in ("api", "create", "pattern"):
+            entry = self.compressed.lookup(term)
+            expected = [
+                (pos, doc['tokens'].count(term))
+                for pos, doc in enumerate(self.searcher.index)
+                if term in doc['tokens']
+            ]
+            self.assertEqual(list(self.compressed.iter_postings(entry)), expected)
+
+    def test_iter_postings_min_pos_skips_blocks(self):
+        entry = self.compressed.lookup("pattern")  # Every document: several blocks
+        self.assertGreater(entry[0], search_engine.INDEX_POSTING_BLOCK * 2)
+        everything = list(self.compressed.iter_postings(entry))
+        for min_pos in (1, 127, 128, 129, 300, 599, 600, 10 ** 6):
+            self.assertEqual(
+                list(self.compressed.iter_postings(entry, min_pos)),
+                [p for p in everything if p[0] >= min_pos],
+                f"min_pos={min_pos}"
+            )
+
+    def test_reranked_hot_cache_is_saved_as_bm25(self):
+        searcher = KeywordSearch(rerank=True)
+        searcher.warm_up(["create crud api"], save=False)
+        searcher.save_index(self.path)
+
+        compressed = CompressedIndex(self.path)
+        self.assertIn(QueryLog.normalize("create crud api"), compressed.hot_cache)
+        results = compressed.search_bm25("create crud api", top_k=5)
+        self.assertNotIn('bm25_score', results[0])
+        self.assertEqual(ranking(results), ranking(self.searcher.search_bm25("create crud api", top_k=5)))
+
+    def test_benchmark_reports_identical_results(self):
+        report = search_engine.benchmark_index(self.searcher, QUERIES, self.tmp / "bench", repeat=1)
+        self.assertTrue(report['identical'])
+        self.assertLess(report['compressed']['size_bytes'], report['baseline']['size_bytes'])
+
+
+if __name__ == "__main__":
+    unittest.main()
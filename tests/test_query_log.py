@@ -0,0 +1,136 @@
+"""Query log rotation and analysis, and the hot-query cache it feeds"""
+
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from coding_agent import search_engine
+from coding_agent.search_engine import HOT_CACHE_MAX_AGE, KeywordSearch, QueryLog
+
+from test_sharded_search import ranking, write_library
+
+
+class QueryLogTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "logs" / "queries.log"
+        self.log = QueryLog(self.path)
+
+    def test_rotation_shifts_backups(self):
+        log = QueryLog(self.path, max_bytes=300, backup_count=2)
+        for i in range(40):
+            log.record(f"query {i}", 1.0, 5)
+
+        self.assertTrue(self.path.exists())
+        self.assertTrue(self.path.with_name("queries.log.1").exists())
+        self.assertTrue(self.path.with_name("queries.log.2").exists())
+        self.assertFalse(self.path.with_name("queries.log.3").exists())
+
+        # The oldest entries fall off; the rest stay in order, newest last
+        queries = [entry['query'] for entry in log.entries()]
+        self.assertLess(len(queries), 40)
+        self.assertEqual(queries, [f"query {i}" for i in range(40 - len(queries), 40)])
+
+    def test_hot_queries_min_count(self):
+        for query, count in (("jwt auth", 3), ("Crud  API", 2), ("pagination", 1)):
+            for _ in range(count):
+                self.log.record(query, 1.0, 5)
+        self.log.record("jwt auth", 1.0, 5, index='symbols')
+
+        self.assertEqual(self.log.hot_queries(index='patterns'), [("jwt auth", 3), ("crud api", 2)])
+        self.assertEqual(self.log.hot_queries(min_count=1, index='patterns')[-1], ("pagination", 1))
+        self.assertEqual(self.log.hot_queries(limit=1), [("jwt auth", 4)])
+
+    def test_nearest_rank_percentiles(self):
+        self.assertEqual(self.log.latency_percentiles(), {})
+        for latency in range(10, 0, -1):
+            self.log.record("q", float(latency), 1)
+        self.assertEqual(self.log.latency_percentiles(), {'p50': 5.0, 'p90': 9.0, 'p99': 10.0})
+
+    def test_cache_file_per_mode(self):
+        self.assertNotEqual(self.log.cache_path('patterns'), self.log.cache_path('patterns', rerank=True))
+        self.assertEqual(self.log.cache_path('patterns', rerank=True).name, "hot_queries.patterns.rerank.json")
+
+
+class HotCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.data_dir = Path(tmp.name)
+        write_library(self.data_dir, count=100)
+        patcher = mock.patch.object(search_engine, 'DATA_DIR', self.data_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.log = QueryLog(self.data_dir / "logs" / "queries.log")
+
+    def test_empty_cache_trusted_until_log_changes(self):
+        searcher = KeywordSearch(query_log=self.log)
+        self.assertEqual(searcher.hot_cache, {})
+        self.assertTrue(KeywordSearch(query_log=self.log).hot_cache_loaded)
+
+        self.log.record("create crud api", 1.0, 5)
+        self.assertFalse(KeywordSearch(query_log=self.log).hot_cache_loaded)
+
+    def test_expired_cache_is_rejected(self):
+        searcher = KeywordSearch(query_log=self.log)
+        searcher.warm_up(["create crud api"])
+        path = self.log.cache_path(KeywordSearch.LOG_NAME)
+        self.assertTrue(searcher.load_hot_cache())
+
+        payload = json.loads(path.read_text(encoding="utf-8"))
+        payload['built'] = time.time() - HOT_CACHE_MAX_AGE - 1
+        path.write_text(json.dumps(payload), encoding="utf-8")
+        self.assertFalse(searcher.load_hot_cache())
+
+    def test_edited_document_rejects_cache(self):
+        searcher = KeywordSearch(query_log=self.log)
+        searcher.warm_up(["create crud api"])
+
+        # Swap one word for another: same length, different tokens
+        doc_file = self.data_dir / "patterns" / "pattern-0.json"
+        doc = json.loads(doc_file.read_text(encoding="utf-8"))
+        words = doc['description'].split()
+        words[0] = "jwt" if words[0] != "jwt" else "page"
+        doc['description'] = ' '.join(words)
+        doc_file.write_text(json.dumps(doc), encoding="utf-8")
+
+        edited = KeywordSearch()
+        self.assertEqual(edited.index[0]['doc_length'], searcher.index[0]['doc_length'])
+        self.assertNotEqual(edited.fingerprint(), searcher.fingerprint())
+        edited.query_log = self.log
+        self.assertFalse(edited.load_hot_cache())
+
+    def test_modes_keep_separate_caches(self):
+        plain = KeywordSearch(query_log=self.log)
+        plain.warm_up(["create crud api"])
+        reranked = KeywordSearch(rerank=True, query_log=self.log)
+        reranked.warm_up(["create crud api"])
+
+        self.assertTrue(KeywordSearch(query_log=self.log).hot_cache_loaded)
+        self.assertTrue(KeywordSearch(rerank=True, query_log=self.log).hot_cache_loaded)
+
+    def test_cached_search_matches_uncached(self):
+        query = "add jwt authentication"
+        expected = ranking(KeywordSearch().search_bm25(query, top_k=5))
+
+        searcher = KeywordSearch(query_log=self.log)
+        searcher.warm_up([query])
+        with mock.patch.object(searcher, '_rank', wraps=searcher._rank) as rank:
+            self.assertEqual(ranking(searcher.search_bm25(query, top_k=5)), expected)
+            rank.assert_not_called()
+            # Non-default parameters bypass the cache
+            searcher.search_bm25(query, top_k=5, k1=1.2)
+            rank.assert_called_once()
+
+        cached = [entry['cached'] for entry in self.log.entries()]
+        self.assertEqual(cached, [True, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+"""Two-stage search: BM25 candidates reranked by hashed-feature vectors"""
+
+import math
+import random
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from coding_agent import search_engine
+from coding_agent.search_engine import CompressedIndex, KeywordSearch
+
+from test_sharded_search import QUERIES, ranking, write_library
+
+
+class DotProductTest(unittest.TestCase):
+
+    def test_fallback_matches_sumprod(self):
+        rng = random.Random(3)
+        a = [rng.uniform(-1, 1) for _ in range(search_engine.RERANK_DIMENSIONS)]
+        b = [rng.uniform(-1, 1) for _ in range(search_engine.RERANK_DIMENSIONS)]
+        expected = math.fsum(x * y for x, y in zip(a, b))
+        self.assertAlmostEqual(search_engine._sumprod(a, b), expected, places=12)
+        self.assertAlmostEqual(search_engine._dot(a, b), expected, places=12)
+        if hasattr(math, 'sumprod'):
+            self.assertAlmostEqual(search_engine._sumprod(a, b), math.sumprod(a, b), places=12)
+
+
+class RerankTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        write_library(self.tmp, count=300)
+        patcher = mock.patch.object(search_engine, 'DATA_DIR', self.tmp)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.searcher = KeywordSearch(rerank=True)
+
+    def captured_candidates(self, query, top_k=5):
+        """Run a reranked search and return the candidates passed to _rerank"""
+        captured = []
+        original = self.searcher._rerank
+
+        def spy(query_tokens, candidates, *args, **kwargs):
+            captured.extend(candidates)
+            return original(query_tokens, candidates, *args, **kwargs)
+
+        with mock.patch.object(self.searcher, '_rerank', spy):
+            self.searcher.search_bm25(query, top_k=top_k)
+        return captured
+
+    def test_candidates_are_bm25_matches_only(self):
+        candidates = self.captured_candidates("add jwt authentication")
+        self.assertTrue(candidates)
+        self.assertTrue(all(score > 0 for score, _ in candidates))
+        plain = self.searcher.search_bm25("add jwt authentication", top_k=1000, rerank=False)
+        self.assertEqual(len(candidates), min(len(plain), search_engine.RERANK_DEPTH))
+
+    def test_candidates_are_capped_at_rerank_depth(self):
+        # Every generated document id contains "pattern"
+        candidates = self.captured_candidates("pattern")
+        self.assertEqual(len(candidates), search_engine.RERANK_DEPTH)
+        scores = [score for score, _ in candidates]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_no_bm25_match_returns_nothing(self):
+        self.assertEqual(self.searcher.search_bm25("zzzz qqqq", rerank=True), [])
+
+    def test_results_carry_blended_score(self):
+        results = self.searcher.search_bm25("create crud api", top_k=10)
+        self.assertTrue(results)
+        for result in results:
+            self.assertGreater(result['bm25_score'], 0)
+            self.assertIn('similarity', result)
+            self.assertLessEqual(abs(result['similarity']), 1.0 + 1e-6)
+        scores = [r['score'] for r in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_plain_search_has_no_rerank_fields(self):
+        result = self.searcher.search_bm25("create crud api", top_k=1, rerank=False)[0]
+        self.assertNotIn('bm25_score', result)
+        self.assertNotIn('similarity', result)
+
+    def test_top_k_is_prefix_of_hot_cache_depth(self):
+        depth = search_engine.HOT_CACHE_DEPTH
+        for query in QUERIES:
+            full = ranking(self.searcher.search_bm25(query, top_k=depth))
+            for top_k in (1, 3, depth):
+                self.assertEqual(ranking(self.searcher.search_bm25(query, top_k=top_k)), full[:top_k], query)
+
+    def test_compressed_index_reranks_with_saved_vectors(self):
+        path = self.tmp / "index.bin"
+        self.searcher.save_index(path)
+        compressed = CompressedIndex(path, rerank=True)
+        with mock.patch.object(CompressedIndex, '_build_vectors', side_effect=AssertionError("rebuilt")):
+            for query in QUERIES:
+                self.assertEqual(
+                    ranking(compressed.search_bm25(query, top_k=10)),
+                    ranking(self.searcher.search_bm25(query, top_k=10)),
+                    query
+                )
+
+    def test_compressed_index_without_rerank_keeps_bm25(self):
+        path = self.tmp / "index.bin"
+        self.searcher.save_index(path)
+        compressed = CompressedIndex(path)
+        with self.assertRaises(ValueError):
+            compressed.search_bm25("create crud api", rerank=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
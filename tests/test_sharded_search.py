@@ -0,0 +1,95 @@
+"""Sharded scatter-gather search must match the unsharded BM25 search exactly"""
+
+import json
+import random
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from coding_agent import search_engine
+from coding_agent.search_engine import KeywordSearch, ShardedKeywordSearch
+
+WORDS = ("create api rest controller endpoint service repository pagination jwt "
+         "authentication token entity database page sort filter search logging test").split()
+
+QUERIES = [
+    "create crud api",
+    "add jwt authentication",
+    "pagination sort page",
+    "search filter repository",
+    "logging configuration",
+    "nothing matches this",
+]
+
+
+def write_library(data_dir, count=300, seed=7):
+    """Write `count` random pattern JSON files under data_dir/patterns"""
+    rng = random.Random(seed)
+    patterns = Path(data_dir) / "patterns"
+    patterns.mkdir(parents=True)
+    for i in range(count):
+        doc = {
+            "id": f"pattern-{i}",
+            "name": " ".join(rng.choice(WORDS) for _ in range(3)),
+            "description": " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 20))),
+            "keywords": rng.sample(WORDS, rng.randint(1, 5)),
+        }
+        (patterns / f"pattern-{i}.json").write_text(json.dumps(doc), encoding="utf-8")
+
+
+def ranking(results):
+    return [(r['id'], r['score']) for r in results]
+
+
+class ShardedSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        write_library(tmp.name)
+        patcher = mock.patch.object(search_engine, 'DATA_DIR', Path(tmp.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.searcher = KeywordSearch()
+
+    def assert_same_results(self, sharded):
+        for query in QUERIES:
+            for top_k in (1, 5, 50):
+                self.assertEqual(
+                    ranking(sharded.search_bm25(query, top_k=top_k)),
+                    ranking(self.searcher.search_bm25(query, top_k=top_k)),
+                    f"{query!r} top_k={top_k}"
+                )
+
+    def test_in_process_shards_match_unsharded(self):
+        for num_shards in (1, 3, 7):
+            sharded = ShardedKeywordSearch(num_shards=num_shards, processes=False)
+            self.assertEqual(sharded.doc_count, self.searcher.doc_count)
+            self.assertEqual(sharded.avg_doc_length, self.searcher.avg_doc_length)
+            self.assert_same_results(sharded)
+
+    def test_worker_processes_match_unsharded(self):
+        with ShardedKeywordSearch(num_shards=3) as sharded:
+            self.assert_same_results(sharded)
+
+    def test_dead_worker_is_reported_as_shard_failure(self):
+        with ShardedKeywordSearch(num_shards=2) as sharded:
+            sharded._workers[1].terminate()
+            sharded._workers[1].join()
+            with self.assertRaisesRegex(RuntimeError, r"Shard 1 failed on '\w+': worker is gone"):
+                sharded.search_bm25("create crud api")
+
+    def test_results_reload_document_data(self):
+        sharded = ShardedKeywordSearch(num_shards=2, processes=False)
+        result = sharded.search_bm25("create crud api", top_k=1)[0]
+        self.assertEqual(result['data']['id'], result['id'])
+
+    def test_rerank_is_rejected(self):
+        sharded = ShardedKeywordSearch(num_shards=2, processes=False)
+        with self.assertRaises(ValueError):
+            sharded.search_bm25("create crud api", rerank=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
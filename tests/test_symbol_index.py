@@ -0,0 +1,195 @@
+"""SymbolIndex must extract declarations with exact line ranges from Java, Kotlin and XML"""
+
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from coding_agent import search_engine
+from coding_agent.search_engine import SymbolIndex
+
+JAVA = textwrap.dedent("""\
+    package com.example;
+
+    @RestController
+    @RequestMapping(
+        value = "/api/users",
+        produces = "application/json"
+    )
+    public class UserController {
+
+        private final UserService service;
+
+        public UserController(UserService service) {
+            this.service = service;
+        }
+
+        @GetMapping("/{id}")
+        public ResponseEntity<User> findUser(
+                @PathVariable Long id,
+                @RequestParam(defaultValue = "false") boolean full) {
+            return ResponseEntity.ok(service.find(id));
+        }
+    }
+
+    public interface UserRepository {
+        List<User> findByName(String name);
+
+        default int pageSize() {
+            return 20;
+        }
+    }
+    """)
+
+KOTLIN = textwrap.dedent("""\
+    package com.example
+
+    class UserService(private val repository: UserRepository) {
+
+        fun count(): Long = repository.count()
+
+        fun load(id: Long): User? = try {
+            repository.findById(id)
+        } catch (e: Exception) {
+            null
+        }
+
+        @Test
+        fun `finds user by id`() {
+            assert(true)
+        }
+
+        companion object {
+            fun create(): UserService {
+                return UserService(UserRepository())
+            }
+        }
+    }
+    """)
+
+XML = textwrap.dedent("""\
+    <configuration>
+        <!-- <appender name="OLD" class="ch.qos.logback.core.ConsoleAppender">
+        </appender> -->
+        <appender name="CONSOLE" class="ch.qos.logback.core.ConsoleAppender">
+            <encoder>
+                <pattern>%msg%n</pattern>
+            </encoder>
+        </appender>
+
+        <appender
+            name="FILE"
+            class="ch.qos.logback.core.FileAppender">
+            <file>app.log</file>
+        </appender>
+
+        <root level="INFO">
+            <appender-ref ref="CONSOLE"/>
+        </root>
+    </configuration>
+    """)
+
+
+class SymbolIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        code = Path(tmp.name) / "code"
+        code.mkdir()
+        (code / "UserController.java").write_text(JAVA, encoding="utf-8")
+        (code / "UserService.kt").write_text(KOTLIN, encoding="utf-8")
+        (code / "logback.xml").write_text(XML, encoding="utf-8")
+        patcher = mock.patch.object(search_engine, 'DATA_DIR', Path(tmp.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.index = SymbolIndex()
+
+    def symbol(self, name, language, kind=None):
+        matches = [doc for doc in self.index.index
+                   if doc['name'] == name and doc['language'] == language and kind in (None, doc['kind'])]
+        self.assertEqual(len(matches), 1, f"expected one symbol {name!r}, got {matches}")
+        return matches[0]
+
+    def assert_range(self, symbol, start, end):
+        self.assertEqual((symbol['start_line'], symbol['end_line']), (start, end))
+
+    def test_java_class_with_multiline_annotation(self):
+        controller = self.symbol('UserController', 'java', kind='class')
+        self.assertEqual(controller['annotations'], ['RestController', 'RequestMapping'])
+        self.assert_range(controller, 3, 22)
+
+    def test_java_constructor(self):
+        # The class and its constructor share a name; the constructor is the method
+        constructor = self.symbol('UserController', 'java', kind='method')
+        self.assertEqual(constructor['parent'], 'UserController')
+        self.assertEqual(constructor['signature'], 'public UserController(UserService service)')
+        self.assert_range(constructor, 12, 14)
+
+    def test_java_multiline_signature(self):
+        method = self.symbol('findUser', 'java')
+        self.assertEqual(method['annotations'], ['GetMapping'])
+        self.assertEqual(
+            method['signature'],
+            'public ResponseEntity<User> findUser( @PathVariable Long id, '
+            '@RequestParam(defaultValue = "false") boolean full)'
+        )
+        self.assert_range(method, 16, 21)
+
+    def test_java_interface_methods(self):
+        repository = self.symbol('UserRepository', 'java')
+        self.assertEqual(repository['kind'], 'interface')
+        self.assert_range(repository, 24, 30)
+        abstract = self.symbol('findByName', 'java')
+        self.assertEqual(abstract['parent'], 'UserRepository')
+        self.assert_range(abstract, 25, 25)
+        self.assert_range(self.symbol('pageSize', 'java'), 27, 29)
+
+    def test_kotlin_expression_bodies(self):
+        self.assert_range(self.symbol('count', 'kotlin'), 5, 5)
+        load = self.symbol('load', 'kotlin')
+        self.assertEqual(load['signature'], 'fun load(id: Long): User?')
+        self.assert_range(load, 7, 11)
+
+    def test_kotlin_backtick_function(self):
+        test = self.symbol('finds user by id', 'kotlin')
+        self.assertEqual(test['annotations'], ['Test'])
+        self.assert_range(test, 13, 16)
+
+    def test_kotlin_companion_object(self):
+        companion = self.symbol('Companion', 'kotlin')
+        self.assertEqual(companion['kind'], 'object')
+        self.assertEqual(companion['parent'], 'UserService')
+        self.assert_range(companion, 18, 22)
+        create = self.symbol('create', 'kotlin')
+        self.assertEqual(create['parent'], 'Companion')
+        self.assert_range(create, 19, 21)
+
+    def test_xml_skips_comments(self):
+        names = [doc['name'] for doc in self.index.index if doc['language'] == 'xml']
+        self.assertEqual(names, ['CONSOLE', 'FILE', 'root'])
+
+    def test_xml_element_ranges(self):
+        console = self.symbol('CONSOLE', 'xml')
+        self.assertEqual(console['class_name'], 'ch.qos.logback.core.ConsoleAppender')
+        self.assertEqual(console['annotations'], [])
+        self.assert_range(console, 4, 8)
+        self.assert_range(self.symbol('root', 'xml'), 16, 18)
+
+    def test_xml_multiline_open_tag(self):
+        appender = self.symbol('FILE', 'xml')
+        self.assertEqual(appender['class_name'], 'ch.qos.logback.core.FileAppender')
+        self.assertEqual(appender['signature'],
+                         '<appender name="FILE" class="ch.qos.logback.core.FileAppender">')
+        self.assert_range(appender, 10, 14)
+
+    def test_format_shows_xml_class(self):
+        results = self.index.search_bm25('console appender', top_k=1)
+        output = self.index.format_results(results, 'console appender')
+        self.assertIn('Class:       ch.qos.logback.core.ConsoleAppender', output)
+        self.assertNotIn('Annotations:', output)
+
+
+if __name__ == '__main__':
+    unittest.main()